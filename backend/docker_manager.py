@@ -1,38 +1,139 @@
+import asyncio
+import json
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
 
 import docker
 from docker.errors import DockerException, NotFound
 
+LOG_CHUNK_SIZE = 65536
+HEALTH_TTL = 1.0  # seconds a health_check() result is reused
+
+
+# Container events that can change what list_projects() reports.
+STATE_EVENTS = ("create", "start", "restart", "stop", "die", "kill", "pause", "unpause", "rename", "destroy")
+
+
+async def _iter_in_thread(gen, executor=None):
+    """Bridge a blocking docker-py stream generator into an async iterator."""
+    loop = asyncio.get_running_loop()
+    try:
+        while (chunk := await loop.run_in_executor(executor, next, gen, None)) is not None:
+            yield chunk
+    finally:
+        gen.close()
+
+
+async def _ready(stream):
+    return stream
+
+
+async def _open_unix_logs(socket_path: str, path: str, tty: bool):
+    """Request a logs endpoint straight off the daemon's unix socket.
+
+    The daemon's status is checked here, so errors are raised before the
+    caller starts its own response. Returns the body as an async iterator.
+    """
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        # HTTP/1.0 makes the daemon send the body as-is rather than chunk-encoded.
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: docker\r\n\r\n".encode())
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(None, 2)[1])
+        if status != 200:
+            body = await reader.read()
+            try:
+                message = json.loads(body)["message"]
+            except (ValueError, KeyError, TypeError):
+                message = body.decode(errors="replace").strip()
+            if status == 404:
+                raise NotFound(message)
+            raise DockerException(f"logs request failed ({status}): {message}")
+    except BaseException:
+        writer.close()
+        raise
+    return _read_unix_logs(reader, writer, tty)
+
+
+async def _read_unix_logs(reader, writer, tty: bool):
+    """Yield the body of a logs response opened by _open_unix_logs().
+
+    The read side is driven by the event loop, so no thread is held per
+    viewer. Non-tty output is demultiplexed here: each frame is an 8-byte
+    header (stream type, 3 padding bytes, big-endian payload size)
+    followed by the payload. All complete frames in a read are yielded
+    as one chunk.
+    """
+    try:
+        if tty:
+            while chunk := await reader.read(LOG_CHUNK_SIZE):
+                yield chunk
+            return
+
+        buf = bytearray()
+        while chunk := await reader.read(LOG_CHUNK_SIZE):
+            buf += chunk
+            out = bytearray()
+            pos = 0
+            while len(buf) - pos >= 8:
+                end = pos + 8 + int.from_bytes(buf[pos + 4:pos + 8], "big")
+                if end > len(buf):
+                    break
+                out += buf[pos + 8:end]
+                pos = end
+            del buf[:pos]
+            if out:
+                yield bytes(out)
+    finally:
+        writer.close()
+
 
 class DockerManager:
     def __init__(self):
         self.client = docker.from_env()
+        self._health_cache = (0.0, None)
+        # Shared by every project restart so concurrent requests stay bounded.
+        self._restart_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="docker-restart")
 
     def close(self):
+        self._restart_pool.shutdown(wait=False, cancel_futures=True)
         self.client.close()
 
-    def _container_info(self, c) -> dict:
-        labels = c.labels or {}
+    def _container_info(self, c: dict) -> dict:
+        """Build our container dict from a raw /containers/json entry."""
+        labels = c.get("Labels") or {}
         ports = {}
-        for container_port, bindings in (c.ports or {}).items():
-            if bindings:
-                ports[container_port] = bindings[0].get("HostPort", "")
+        for p in c.get("Ports") or []:
+            if p.get("PublicPort"):
+                ports.setdefault(f"{p['PrivatePort']}/{p['Type']}", str(p["PublicPort"]))
+        image = c.get("Image", "")
+        if image.startswith("sha256:"):
+            image = image[:17]
+        names = c.get("Names") or []
         return {
-            "id": c.short_id,
-            "full_id": c.id,
-            "name": c.name,
-            "image": str(c.image.tags[0]) if c.image.tags else str(c.image.short_id),
-            "status": c.status,
-            "state": c.attrs.get("State", {}).get("Status", c.status),
+            "id": c["Id"][:12],
+            "full_id": c["Id"],
+            "name": names[0].lstrip("/") if names else c["Id"][:12],
+            "image": image,
+            "status": c.get("State", ""),
+            "state": c.get("State", ""),
             "ports": ports,
             "compose_project": labels.get("com.docker.compose.project", ""),
             "compose_service": labels.get("com.docker.compose.service", ""),
             "compose_workdir": labels.get("com.docker.compose.project.working_dir", ""),
         }
 
+    def iter_containers(self):
+        """Fetch the listing now; convert each entry lazily as it is consumed."""
+        # The low-level listing carries every field we need in a single request;
+        # client.containers.list() would inspect each container individually.
+        raw = self.client.api.containers(all=True)
+        return map(self._container_info, raw)
+
     def list_containers(self) -> list[dict]:
-        containers = self.client.containers.list(all=True)
-        return [self._container_info(c) for c in containers]
+        return list(self.iter_containers())
 
     def list_projects(self) -> list[dict]:
         containers = self.list_containers()
@@ -60,12 +161,26 @@ class DockerManager:
 
         return sorted(projects.values(), key=lambda p: (p["name"] == "_standalone", p["name"]))
 
+    def events(self):
+        """Blocking stream of container lifecycle events from the daemon."""
+        return self.client.events(
+            decode=True,
+            filters={"type": "container", "event": list(STATE_EVENTS)},
+        )
+
     def compose_action(self, project: str, action: str) -> dict:
-        projects = {p["name"]: p for p in self.list_projects()}
-        if project not in projects:
+        if action == "restart":
+            # No compose file parsing needed: restart the existing containers directly
+            # instead of paying for a `docker compose` CLI start-up.
+            return self._restart_project(project)
+
+        matches = self.client.api.containers(
+            all=True, filters={"label": f"com.docker.compose.project={project}"}, limit=1
+        )
+        if not matches:
             return {"ok": False, "error": f"Project '{project}' not found"}
 
-        workdir = projects[project].get("workdir")
+        workdir = (matches[0].get("Labels") or {}).get("com.docker.compose.project.working_dir")
         if not workdir:
             return {"ok": False, "error": f"No workdir for project '{project}'"}
 
@@ -78,36 +193,68 @@ class DockerManager:
             return {"ok": False, "error": result.stderr.strip() or result.stdout.strip()}
         return {"ok": True, "output": result.stdout.strip()}
 
-    def container_action(self, container_id: str, action: str) -> dict:
-        try:
-            container = self.client.containers.get(container_id)
-        except NotFound:
-            return {"ok": False, "error": f"Container '{container_id}' not found"}
+    def _restart_project(self, project: str) -> dict:
+        ids = [
+            c["Id"]
+            for c in self.client.api.containers(
+                all=True,
+                filters={"label": [f"com.docker.compose.project={project}", "com.docker.compose.oneoff=False"]},
+            )
+        ]
+        if not ids:
+            return {"ok": False, "error": f"Project '{project}' not found"}
 
+        futures = [self._restart_pool.submit(self.client.api.restart, cid, timeout=10) for cid in ids]
+        errors = [str(e) for e in (f.exception() for f in futures) if e is not None]
+        if errors:
+            return {"ok": False, "error": "\n".join(errors)}
+        return {"ok": True, "output": f"Restarted {len(ids)} container(s)"}
+
+    def container_action(self, container_id: str, action: str) -> dict:
+        # Low-level calls take the id or name directly; going through
+        # client.containers.get() would cost an extra inspect per action.
+        api = self.client.api
         try:
             if action == "start":
-                container.start()
+                api.start(container_id)
             elif action == "stop":
-                container.stop(timeout=10)
+                api.stop(container_id, timeout=10)
             elif action == "restart":
-                container.restart(timeout=10)
+                api.restart(container_id, timeout=10)
             elif action == "remove":
-                container.remove(force=True)
+                api.remove_container(container_id, force=True)
             else:
                 return {"ok": False, "error": f"Unknown action '{action}'"}
+        except NotFound:
+            return {"ok": False, "error": f"Container '{container_id}' not found"}
         except DockerException as e:
             return {"ok": False, "error": str(e)}
 
         return {"ok": True}
 
-    def container_logs(self, container_id: str, tail: int = 200):
-        container = self.client.containers.get(container_id)
-        return container.logs(stream=True, follow=True, tail=tail)
+    def container_logs(self, container_id: str, tail: int = 200, executor=None):
+        """Blocking: inspect the container, then return an awaitable that opens its logs.
+
+        Call this on the API pool and await the result on the event loop.
+        Awaiting sends the request (unix-socket daemons) and checks the
+        daemon's answer, raising NotFound/DockerException before any response
+        is started; it resolves to an async iterator of byte chunks.
+        """
+        api = self.client.api
+        info = api.inspect_container(container_id)
+        socket_path = getattr(api.get_adapter(api.base_url), "socket_path", None)
+        if socket_path is None:
+            # TCP / named-pipe daemons: fall back to docker-py's blocking stream.
+            # api.logs() has already sent the request and checked the status here.
+            return _ready(_iter_in_thread(api.logs(info["Id"], stream=True, follow=True, tail=tail), executor))
+
+        query = urlencode({"stdout": 1, "stderr": 1, "follow": 1, "tail": tail})
+        path = f"/v{api.api_version}/containers/{info['Id']}/logs?{query}"
+        return _open_unix_logs(socket_path, path, info["Config"]["Tty"])
 
     def container_exec(self, container_id: str, cols: int = 80, rows: int = 24):
-        container = self.client.containers.get(container_id)
         exec_id = self.client.api.exec_create(
-            container.id,
+            container_id,
             cmd="/bin/sh",
             stdin=True,
             tty=True,
@@ -122,6 +269,15 @@ class DockerManager:
         self.client.api.exec_resize(exec_id, height=rows, width=cols)
 
     def health_check(self) -> dict:
+        now = time.monotonic()
+        ts, cached = self._health_cache
+        if cached is not None and now - ts < HEALTH_TTL:
+            return cached
+        result = self._health_check()
+        self._health_cache = (now, result)
+        return result
+
+    def _health_check(self) -> dict:
         try:
             self.client.ping()
             info = self.client.info()
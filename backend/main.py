@@ -1,14 +1,17 @@
 import asyncio
 import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 logger = logging.getLogger("quickdocker")
 
+import orjson
 from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from docker.errors import DockerException, NotFound
 
@@ -21,8 +24,18 @@ dm: DockerManager
 async def lifespan(app: FastAPI):
     global dm
     dm = DockerManager()
+    # Short Docker API calls and long-lived stream readers get separate pools so
+    # open shells and log viewers can't starve REST requests.
+    app.state.docker_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="docker-api")
+    app.state.stream_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="docker-stream")
+    tasks = [asyncio.create_task(_broadcaster()), asyncio.create_task(_event_watcher())]
     yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
     dm.close()
+    app.state.docker_pool.shutdown(wait=False, cancel_futures=True)
+    app.state.stream_pool.shutdown(wait=False, cancel_futures=True)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -35,18 +48,28 @@ app.add_middleware(
 )
 
 
+def _docker_call(fn, *args):
+    """Run a short blocking Docker API call on the API pool."""
+    return asyncio.get_running_loop().run_in_executor(app.state.docker_pool, fn, *args)
+
+
+def _stream_call(fn, *args):
+    """Run a blocking read/write on a long-lived stream on the stream pool."""
+    return asyncio.get_running_loop().run_in_executor(app.state.stream_pool, fn, *args)
+
+
 # --- Exception handler ---
 
 @app.exception_handler(DockerException)
 async def docker_exception_handler(request, exc):
-    raise HTTPException(status_code=503, detail=f"Docker error: {exc}")
+    return JSONResponse(status_code=503, content={"detail": f"Docker error: {exc}"})
 
 
 # --- REST endpoints ---
 
 @app.get("/api/health")
 async def health():
-    result = await asyncio.to_thread(dm.health_check)
+    result = await _docker_call(dm.health_check)
     if not result["ok"]:
         raise HTTPException(status_code=503, detail=result["error"])
     return result
@@ -54,19 +77,31 @@ async def health():
 
 @app.get("/api/projects")
 async def list_projects():
-    return await asyncio.to_thread(dm.list_projects)
+    return Response(orjson.dumps(await _docker_call(dm.list_projects)), media_type="application/json")
 
 
 @app.get("/api/containers")
 async def list_containers():
-    return await asyncio.to_thread(dm.list_containers)
+    return Response(orjson.dumps(await _docker_call(dm.list_containers)), media_type="application/json")
+
+
+@app.get("/api/containers/stream")
+async def stream_containers():
+    # NDJSON: one container per line, so clients can render before the listing ends.
+    containers = await _docker_call(dm.iter_containers)
+
+    async def ndjson():
+        for info in containers:
+            yield orjson.dumps(info) + b"\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
 
 
 @app.post("/api/compose/{project}/{action}")
 async def compose_action(project: str, action: str):
     if action not in ("up", "down", "stop", "restart"):
         raise HTTPException(status_code=400, detail=f"Invalid action: {action}")
-    result = await asyncio.to_thread(dm.compose_action, project, action)
+    result = await _docker_call(dm.compose_action, project, action)
     if not result["ok"]:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
@@ -76,7 +111,7 @@ async def compose_action(project: str, action: str):
 async def container_action(container_id: str, action: str):
     if action not in ("start", "stop", "restart"):
         raise HTTPException(status_code=400, detail=f"Invalid action: {action}")
-    result = await asyncio.to_thread(dm.container_action, container_id, action)
+    result = await _docker_call(dm.container_action, container_id, action)
     if not result["ok"]:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
@@ -84,36 +119,156 @@ async def container_action(container_id: str, action: str):
 
 @app.delete("/api/container/{container_id}")
 async def container_remove(container_id: str):
-    result = await asyncio.to_thread(dm.container_action, container_id, "remove")
+    result = await _docker_call(dm.container_action, container_id, "remove")
     if not result["ok"]:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
 
 
+LOG_MAX_PENDING = 1024 * 1024
+LOG_FLUSH_DELAY = 0.1  # flush a trailing partial line after this much quiet
+LOG_MAX_TAIL = 10_000
+LOG_MAX_LINES = 1_000_000  # a follower this long should reconnect
+
+
 @app.get("/api/container/{container_id}/logs")
 async def container_logs(container_id: str, tail: int = 200):
+    tail = min(max(tail, 0), LOG_MAX_TAIL)
     try:
-        log_gen = await asyncio.to_thread(dm.container_logs, container_id, tail)
+        open_logs = await _docker_call(dm.container_logs, container_id, tail, app.state.stream_pool)
+        log_stream = await open_logs
     except NotFound:
         raise HTTPException(status_code=404, detail="Container not found")
 
+    def sse_event(block: bytes) -> bytes:
+        # The JSON string escapes newlines, so a block of lines is one message.
+        return b"data: " + orjson.dumps(block.decode("utf-8", errors="replace")) + b"\n\n"
+
     async def sse_stream():
-        while True:
-            try:
-                chunk = await asyncio.to_thread(next, log_gen)
-                text = chunk.decode("utf-8", errors="replace")
-                for line in text.splitlines(keepends=True):
-                    escaped = json.dumps(line)
-                    yield f"data: {escaped}\n\n"
-            except StopIteration:
-                break
+        # Only complete lines are sent, so lines (and UTF-8 sequences) split
+        # across chunks arrive whole. A partial line is held back until its
+        # newline arrives, it grows past LOG_MAX_PENDING, or the stream goes
+        # quiet for LOG_FLUSH_DELAY (prompts, \r progress bars).
+        pending = bytearray()
+        lines = 0
+        next_chunk = None
+        try:
+            while True:
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(log_stream.__anext__())
+                # asyncio.wait() rather than wait_for(): a timeout must not cancel
+                # the read, which would close the log stream.
+                done, _ = await asyncio.wait({next_chunk}, timeout=LOG_FLUSH_DELAY if pending else None)
+                if not done:
+                    yield sse_event(bytes(pending))
+                    pending.clear()
+                    continue
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_chunk = None
+                pending += chunk
+                cut = pending.rfind(b"\n") + 1
+                if not cut:
+                    if len(pending) < LOG_MAX_PENDING:
+                        continue
+                    cut = len(pending)
+                block = bytes(pending[:cut])
+                del pending[:cut]
+                yield sse_event(block)
+                lines += block.count(b"\n")
+                if lines >= LOG_MAX_LINES:
+                    return
+            if pending:
+                yield sse_event(bytes(pending))
+        finally:
+            if next_chunk is not None:
+                next_chunk.cancel()
+                await asyncio.wait({next_chunk})
+            # Runs on client disconnect too, releasing the daemon connection.
+            await log_stream.aclose()
 
     return StreamingResponse(sse_stream(), media_type="text/event-stream")
 
 
 # --- WebSocket: live events ---
 
+STATE_HEARTBEAT = 15.0  # refresh, and keep idle sockets alive, even without Docker events
+STATE_KEEPALIVE = orjson.dumps({"type": "hb"}).decode()
+STATE_DEBOUNCE = 0.25  # coalesce bursts of events (e.g. compose up)
+STATE_SEND_TIMEOUT = 5.0  # a client that can't take a frame this fast is dropped
+
 event_clients: set[WebSocket] = set()
+_state_cache = {"message": None}
+_state_dirty = asyncio.Event()
+
+
+async def _send_state(websocket: WebSocket, message: str):
+    # Bounded so one stalled client can't hold up the broadcast to everyone else.
+    try:
+        await asyncio.wait_for(websocket.send_text(message), timeout=STATE_SEND_TIMEOUT)
+    except Exception:
+        event_clients.discard(websocket)
+        try:
+            await asyncio.wait_for(websocket.close(), timeout=1.0)
+        except Exception:
+            pass
+
+
+async def _broadcaster():
+    """Refresh project state when Docker reports a change and push it to every events client."""
+    last_sent = 0.0
+    while True:
+        try:
+            projects = await _docker_call(dm.list_projects)
+        except Exception as e:
+            logger.error("state refresh failed: %s", e)
+        else:
+            now = time.monotonic()
+            # Encoded once and shared by every client.
+            message = orjson.dumps({"type": "state", "projects": projects}).decode()
+            if message != _state_cache["message"]:
+                _state_cache["message"] = message
+            elif now - last_sent >= STATE_HEARTBEAT:
+                # Nothing changed; a tiny frame keeps proxies from dropping the socket.
+                message = STATE_KEEPALIVE
+            else:
+                message = None
+            if message is not None:
+                last_sent = now
+                await asyncio.gather(*(_send_state(ws, message) for ws in list(event_clients)))
+        try:
+            await asyncio.wait_for(_state_dirty.wait(), timeout=STATE_HEARTBEAT)
+            await asyncio.sleep(STATE_DEBOUNCE)
+        except asyncio.TimeoutError:
+            pass
+        _state_dirty.clear()
+
+
+async def _event_watcher():
+    """Follow the Docker event stream and wake the broadcaster on container changes."""
+    while True:
+        events = None
+        try:
+            events = await _docker_call(dm.events)
+            # Whatever happened while we were not subscribed is unknown; refresh.
+            _state_dirty.set()
+            while await _stream_call(next, events, None) is not None:
+                _state_dirty.set()
+            logger.warning("docker event stream ended, resubscribing")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("docker event stream error: %s", e)
+        finally:
+            if events is not None:
+                try:
+                    events.close()
+                except Exception:
+                    pass
+        await asyncio.sleep(5)
 
 
 @app.websocket("/api/ws/events")
@@ -121,10 +276,13 @@ async def ws_events(websocket: WebSocket):
     await websocket.accept()
     event_clients.add(websocket)
     try:
+        if _state_cache["message"] is not None:
+            await websocket.send_text(_state_cache["message"])
+        # State is pushed by the broadcaster; just wait for the client to go away.
         while True:
-            projects = await asyncio.to_thread(dm.list_projects)
-            await websocket.send_json({"type": "state", "projects": projects})
-            await asyncio.sleep(2)
+            msg = await websocket.receive()
+            if msg.get("type") == "websocket.disconnect":
+                break
     except (WebSocketDisconnect, Exception):
         pass
     finally:
@@ -133,12 +291,17 @@ async def ws_events(websocket: WebSocket):
 
 # --- WebSocket: exec/shell ---
 
+EXEC_BUFFER_SIZE = 65536
+EXEC_BATCH_SIZE = 16384
+EXEC_BATCH_DELAY = 0.005
+
+
 @app.websocket("/api/ws/exec/{container_id}")
 async def ws_exec(websocket: WebSocket, container_id: str):
     await websocket.accept()
 
     try:
-        exec_id, sock = await asyncio.to_thread(dm.container_exec, container_id)
+        exec_id, sock = await _docker_call(dm.container_exec, container_id)
     except NotFound:
         await websocket.close(code=1008, reason="Container not found")
         return
@@ -148,34 +311,48 @@ async def ws_exec(websocket: WebSocket, container_id: str):
 
     logger.info("exec started for container %s, exec_id=%s", container_id, exec_id)
 
-    # Get the raw socket - keep it blocking for the reader thread
+    # Driven by the event loop's selector: no reader thread and no timeout polling.
     raw = sock._sock
-    raw.settimeout(1.0)  # 1s timeout so reader thread can check for shutdown
+    raw.setblocking(False)
 
     closed = asyncio.Event()
 
     async def read_from_docker():
-        """Read from Docker socket in a thread, send to WebSocket."""
-        import socket as _socket
-        loop = asyncio.get_event_loop()
-        while not closed.is_set():
-            try:
-                data = await loop.run_in_executor(None, lambda: raw.recv(4096))
-                if not data:
+        """Read from Docker socket as data arrives, send to WebSocket."""
+        loop = asyncio.get_running_loop()
+        view = memoryview(bytearray(EXEC_BUFFER_SIZE))
+        # Bound once: this loop runs for every chunk of shell output.
+        sock_recv_into, recv_into, send_bytes = loop.sock_recv_into, raw.recv_into, websocket.send_bytes
+        eof = False
+        try:
+            while not eof:
+                n = await sock_recv_into(raw, view)
+                if not n:
                     break
-                await websocket.send_bytes(data)
-            except _socket.timeout:
-                continue  # just loop and check closed flag
-            except Exception as e:
-                logger.error("exec read error: %s", e)
-                break
-        closed.set()
+                if n < EXEC_BATCH_SIZE:
+                    # Chatty processes write in small pieces; give them a few ms
+                    # and send whatever accumulated as a single frame.
+                    await asyncio.sleep(EXEC_BATCH_DELAY)
+                    while n < EXEC_BATCH_SIZE:
+                        try:
+                            got = recv_into(view[n:EXEC_BATCH_SIZE])
+                        except BlockingIOError:
+                            break
+                        if not got:
+                            eof = True
+                            break
+                        n += got
+                await send_bytes(bytes(view[:n]))
+        except Exception as e:
+            logger.error("exec read error: %s", e)
+        finally:
+            closed.set()
 
     async def write_to_docker():
         """Read from WebSocket, write to Docker socket."""
-        loop = asyncio.get_event_loop()
-        while not closed.is_set():
-            try:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
                 msg = await websocket.receive()
                 if msg.get("type") == "websocket.disconnect":
                     break
@@ -184,28 +361,30 @@ async def ws_exec(websocket: WebSocket, container_id: str):
                     try:
                         parsed = json.loads(text)
                         if parsed.get("type") == "resize":
-                            await asyncio.to_thread(
+                            await _docker_call(
                                 dm.exec_resize, exec_id, parsed["cols"], parsed["rows"]
                             )
                             continue
                     except (json.JSONDecodeError, KeyError):
                         pass
-                    await loop.run_in_executor(None, lambda t=text: raw.sendall(t.encode()))
+                    await loop.sock_sendall(raw, text.encode())
                 elif "bytes" in msg:
-                    await loop.run_in_executor(None, lambda b=msg["bytes"]: raw.sendall(b))
-            except WebSocketDisconnect:
-                break
-            except Exception as e:
-                logger.error("exec write error: %s", e)
-                break
-        closed.set()
+                    await loop.sock_sendall(raw, msg["bytes"])
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error("exec write error: %s", e)
+        finally:
+            closed.set()
 
+    tasks = [asyncio.create_task(read_from_docker()), asyncio.create_task(write_to_docker())]
     try:
-        await asyncio.gather(read_from_docker(), write_to_docker())
-    except Exception as e:
-        logger.error("exec gather error: %s", e)
+        # Either side finishing ends the session; the other is cancelled.
+        await closed.wait()
     finally:
-        closed.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.wait(tasks)
         try:
             raw.close()
         except Exception: